@@ -1,10 +1,16 @@
-import time
+import asyncio
 import traceback
 
 from fastapi import APIRouter
 
 from app.core.config import settings
-from app.models.schemas import JudgeResult, JudgeStatus, Submission
+from app.models.schemas import (
+    BatchJudgeResult,
+    BatchSubmission,
+    JudgeResult,
+    JudgeStatus,
+    Submission,
+)
 from app.utils.logger import logger
 from app.utils.redis import RedisManager, RedisQueue
 
@@ -32,15 +38,17 @@ async def create_judge_task(submission: Submission) -> JudgeResult:
 
     # submit task to redis
     try:
+        submitted_at = RedisManager.timestamp()
         await RedisManager.hset(
             key,
             mapping={
                 "status": JudgeStatus.PENDING,
-                "submitted_at": time.time(),
+                "submitted_at": submitted_at,
                 "data": submission.model_dump_json(),
             },
         )
         await RedisManager.expire(key, settings.RESULT_EXPIRY_TIME)
+        await RedisManager.index_task(submission.task_id, submitted_at)
         await RedisManager.push(RedisQueue.SUBMISSIONS, submission.model_dump_json())
         await RedisManager.incr(RedisQueue.SUBMITTED)
     except Exception as e:
@@ -75,8 +83,17 @@ async def create_judge_task(submission: Submission) -> JudgeResult:
 
     try:
         # Clean up result and task status
-        await RedisManager.delete([key])
+        await RedisManager.drop_tasks([submission.task_id])
         return JudgeResult.model_validate_json(result_data)
     except Exception as e:
         logger.error(traceback.format_exc())
         return handle_failed_result(failed, e)
+
+
+@router.post("/batch", response_model=BatchJudgeResult)
+async def create_judge_tasks(batch: BatchSubmission) -> BatchJudgeResult:
+    r"""Submit several submissions in one request and wait for all results, in order."""
+    results = await asyncio.gather(
+        *(create_judge_task(submission) for submission in batch.submissions)
+    )
+    return BatchJudgeResult(results=results)
@@ -31,6 +31,7 @@ class Settings(BaseSettings):
     MAX_LATENCY: int = 75
     MAX_TASK_EXECUTION_TIME: int = 60
     RESULT_EXPIRY_TIME: int = 3600
+    MAX_BATCH_SIZE: int = 1000  # submissions per batch request
 
     # Manager settings
     MONITOR_INTERVAL: int = 10
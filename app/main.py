@@ -9,7 +9,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.router import api_router
 from app.core.config import settings
 from app.utils.logger import logger
-from app.utils.redis import get_redis
+from app.utils.redis import enable_expiry_events, get_redis
 from app.workers.manager import WorkerManager
 
 # Global worker manager reference
@@ -36,6 +36,7 @@ async def lifespan(app: FastAPI):
     manager.start()
     redis = await get_redis()
     await redis.flushall()
+    await enable_expiry_events()
 
     try:
         yield
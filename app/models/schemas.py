@@ -4,6 +4,8 @@ from typing import Any
 
 from pydantic import BaseModel, Field
 
+from app.core.config import settings
+
 
 class Language(str, Enum):
     PYTHON = "python"
@@ -68,3 +70,12 @@ class JudgeResult(BaseModel):
     test_case_results: list[TestCaseResult] | None = None
     task_id: str | None = None
     metadata: dict[str, Any] | None = None
+
+
+class BatchSubmission(BaseModel):
+    # Each submission holds a Redis connection while it waits, so batches are capped
+    submissions: list[Submission] = Field(..., min_length=1, max_length=settings.MAX_BATCH_SIZE)
+
+
+class BatchJudgeResult(BaseModel):
+    results: list[JudgeResult]
@@ -1,9 +1,11 @@
 import json
 import threading
+import time
 from enum import Enum
 from typing import Any
 
 from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
 
 from app.core.config import settings
 from app.utils.logger import logger
@@ -16,6 +18,7 @@ class RedisQueue(Enum):
     SUBMISSIONS = "submissions"
     RESULTS = "results"
     TASKS = "tasks"
+    TASK_INDEX = "task_index"
     PROCESSED = "processed"
     SUBMITTED = "submitted"
     FETCHED = "fetched"
@@ -40,6 +43,22 @@ async def get_redis():
     return _local.redis_client
 
 
+async def enable_expiry_events() -> bool:
+    r"""Ask Redis to publish key expiry events, return whether they are available."""
+    redis = await get_redis()
+    try:
+        config = await redis.config_get("notify-keyspace-events")
+        flags = next(iter(config.values()), b"")
+        flags = flags.decode("utf-8") if isinstance(flags, bytes) else flags
+        if "E" in flags and ("x" in flags or "A" in flags):
+            return True
+        await redis.config_set("notify-keyspace-events", f"{flags}Ex")
+        return True
+    except Exception as e:
+        logger.warning(f"Key expiry events unavailable, falling back to periodic cleanup: {str(e)}")
+        return False
+
+
 async def close_redis():
     r"""Close the Redis connection for the current thread."""
     if hasattr(_local, "redis_client") and _local.redis_client is not None:
@@ -59,10 +78,33 @@ class RedisManager:
             else f"{settings.REDIS_PREFIX}:{queue.value}"
         )
 
+    @staticmethod
+    def timestamp() -> int:
+        r"""Get the current wall-clock time in integer milliseconds, as stored on task hashes."""
+        return time.time_ns() // 1_000_000
+
+    @staticmethod
+    def prefix(queue: RedisQueue) -> str:
+        r"""Get the common prefix of all keys in a queue."""
+        return f"{settings.REDIS_PREFIX}:{queue.value}:"
+
     @staticmethod
     def pattern(queue: RedisQueue) -> str:
         r"""Get the pattern for all task keys."""
-        return f"{settings.REDIS_PREFIX}:{queue.value}:*"
+        return f"{RedisManager.prefix(queue)}*"
+
+    @staticmethod
+    def expired_channel() -> str:
+        r"""Get the keyevent channel on which Redis announces expired keys."""
+        return f"__keyevent@{settings.REDIS_DB}__:expired"
+
+    @staticmethod
+    async def subscribe(channel: str) -> PubSub:
+        r"""Subscribe to a channel and return the pubsub handle."""
+        redis = await get_redis()
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(channel)
+        return pubsub
 
     @staticmethod
     async def get_hash_fields(key: str, fields: list[str] = None) -> dict[str, Any]:
@@ -85,23 +127,41 @@ class RedisManager:
             return {}
 
     @staticmethod
-    async def push(queue: RedisQueue | str, data: str | dict | bytes) -> int | None:
-        r"""Push data to a queue, automatically handle serialization."""
+    def serialize(data: str | dict | bytes) -> str | bytes:
+        r"""Serialize a queue item into a value Redis can store."""
+        if isinstance(data, dict):
+            return json.dumps(data)
+        if not isinstance(data, str | bytes):
+            return str(data)
+        return data
+
+    @staticmethod
+    async def push(queue: RedisQueue | str, *data: str | dict | bytes) -> int | None:
+        r"""Push one or more items to a queue, automatically handle serialization."""
         if isinstance(queue, RedisQueue):
             queue = queue.value
 
         redis = await get_redis()
         try:
-            if isinstance(data, dict):
-                data = json.dumps(data)
-            elif not isinstance(data, str | bytes):
-                data = str(data)
-
-            return await redis.rpush(queue, data)
+            return await redis.rpush(queue, *(RedisManager.serialize(item) for item in data))
         except Exception as e:
             logger.error(f"Failed to push data to queue {queue}: {str(e)}")
             return None
 
+    @staticmethod
+    async def push_many(items: list[tuple[RedisQueue | str, str | dict | bytes]]) -> list | None:
+        r"""Push items to several queues in a single round trip."""
+        redis = await get_redis()
+        try:
+            pipe = redis.pipeline()
+            for queue, data in items:
+                queue = queue.value if isinstance(queue, RedisQueue) else queue
+                pipe.rpush(queue, RedisManager.serialize(data))
+            return await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to push data to {len(items)} queues: {str(e)}")
+            return None
+
     @staticmethod
     async def get(queue: RedisQueue) -> str | None:
         r"""Get data from a queue."""
@@ -139,14 +199,49 @@ class RedisManager:
         return await redis.exists(key)
 
     @staticmethod
-    async def delete(keys: list[str]) -> int:
-        r"""Delete a list of keys."""
+    async def exists_many(keys: list[str]) -> list[bool]:
+        r"""Check which of several keys exist in a single round trip."""
         redis = await get_redis()
         pipe = redis.pipeline()
         for key in keys:
-            pipe.delete(key)
+            pipe.exists(key)
+        return [bool(found) for found in await pipe.execute()]
+
+    @staticmethod
+    async def index_task(task_id: str, submitted_at: int) -> int:
+        r"""Record a task in the submission-time index."""
+        redis = await get_redis()
+        return await redis.zadd(RedisManager.queue(RedisQueue.TASK_INDEX), {task_id: submitted_at})
+
+    @staticmethod
+    async def tasks_submitted_before(cutoff: int, count: int = 1000) -> list[str]:
+        r"""Get up to count task ids submitted before the cutoff, oldest first."""
+        redis = await get_redis()
+        task_ids = await redis.zrangebyscore(
+            RedisManager.queue(RedisQueue.TASK_INDEX), "-inf", f"({cutoff}", start=0, num=count
+        )
+        return [task_id.decode("utf-8") for task_id in task_ids]
+
+    @staticmethod
+    async def drop_tasks(task_ids: list[str]) -> list:
+        r"""Remove tasks, their result queues and their index entries in a single round trip."""
+        redis = await get_redis()
+        pipe = redis.pipeline()
+        pipe.unlink(
+            *(RedisManager.queue(RedisQueue.TASKS, task_id) for task_id in task_ids),
+            *(RedisManager.queue(RedisQueue.RESULTS, task_id) for task_id in task_ids),
+        )
+        pipe.zrem(RedisManager.queue(RedisQueue.TASK_INDEX), *task_ids)
         return await pipe.execute()
 
+    @staticmethod
+    async def unlink(keys: list[str]) -> int:
+        r"""Remove a list of keys, reclaiming their memory in the background."""
+        if not keys:
+            return 0
+        redis = await get_redis()
+        return await redis.unlink(*keys)
+
     @staticmethod
     async def expire(key: str, seconds: int = settings.RESULT_EXPIRY_TIME) -> int:
         r"""Set the expiration time for a key."""
@@ -1,6 +1,5 @@
 import asyncio
 import signal
-import time
 from multiprocessing import Process
 
 from app.core.config import settings
@@ -23,7 +22,7 @@ class JudgeWorker(Process):
 
         try:
             await RedisManager.hset(
-                task_key, {"status": JudgeStatus.RUNNING, "running_at": time.time()}
+                task_key, {"status": JudgeStatus.RUNNING, "running_at": RedisManager.timestamp()}
             )
             await RedisManager.expire(task_key, settings.RESULT_EXPIRY_TIME)
             result = await process_judge_task(submission)
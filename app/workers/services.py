@@ -2,16 +2,25 @@ import asyncio
 import threading
 import time
 from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from collections.abc import Iterator
 
 import psutil
 
 from app.core.config import settings
 from app.models.schemas import JudgeResult, JudgeStatus
 from app.utils.logger import logger
-from app.utils.redis import RedisManager, RedisQueue
+from app.utils.redis import RedisManager, RedisQueue, close_redis, get_redis
 from app.workers.judge_worker import JudgeWorker
 
 
+def _task_id_from_key(key: bytes | str) -> str:
+    r"""Extract the task id from a namespaced Redis key such as ``prefix:tasks:<task_id>``."""
+    if isinstance(key, bytes):
+        return key.rpartition(b":")[2].decode("utf-8")
+    return key.rpartition(":")[2]
+
+
 class ThreadWorker(ABC):
     r"""Base class for background sync thread workers."""
 
@@ -34,6 +43,10 @@ class ThreadWorker(ABC):
         self.running = False
         self.exit_event.set()
 
+    def wait(self) -> bool:
+        r"""Block until the next tick, return True if the worker should exit."""
+        return self.exit_event.wait(self.interval)
+
     def run(self):
         try:
             while self.running:
@@ -42,7 +55,7 @@ class ThreadWorker(ABC):
                 except Exception as e:
                     logger.error(f"Error in worker {self.name}: {str(e)}")
 
-                if not self.exit_event.wait(self.interval):
+                if not self.wait():
                     continue
                 break
         except Exception as e:
@@ -58,23 +71,38 @@ class AsyncThreadWorker(ThreadWorker):
 
     def __init__(self, name: str, interval: float):
         super().__init__(name=name, interval=interval)
+        self.loop = None
 
     def run(self):
+        # One event loop and one Redis client live for the whole thread, every tick reuses them
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            self.loop.run_until_complete(get_redis())
 
             while self.running:
                 try:
-                    loop.run_until_complete(self.async_execute())
+                    self.loop.run_until_complete(self.async_execute())
                 except Exception as e:
                     logger.error(f"Error in worker {self.name}: {str(e)}")
 
-                if not self.exit_event.wait(self.interval):
+                if not self.wait():
                     continue
                 break
         except Exception as e:
             logger.error(f"Error in worker {self.name}: {str(e)}")
+        finally:
+            self.shutdown_loop()
+
+    def shutdown_loop(self):
+        r"""Release the thread's Redis client and close its event loop."""
+        try:
+            self.loop.run_until_complete(close_redis())
+        except Exception as e:
+            logger.error(f"Error closing Redis in worker {self.name}: {str(e)}")
+        finally:
+            self.loop.close()
+            self.loop = None
 
     def execute(self):
         pass
@@ -92,11 +120,33 @@ class WorkerMonitor(ThreadWorker):
         self.workers = workers
 
     def execute(self):
-        status = self.check_workers_status()
+        children_of = self.snapshot_process_tree()
+        status = self.check_workers_status(children_of)
         self.log_status_summary(status)
 
-    def check_workers_status(self):
+    @staticmethod
+    def snapshot_process_tree() -> dict[int, list[int]]:
+        r"""Build a parent -> children pid mapping from a single system-wide scan."""
+        children_of = defaultdict(list)
+        for pid, ppid in psutil._psplatform.ppid_map().items():
+            children_of[ppid].append(pid)
+        return children_of
+
+    @staticmethod
+    def iter_descendants(pid: int, children_of: dict[int, list[int]]) -> Iterator[psutil.Process]:
+        r"""Walk the descendants of a process breadth-first using a tree snapshot."""
+        queue = deque(children_of.get(pid, ()))
+        while queue:
+            child_pid = queue.popleft()
+            queue.extend(children_of.get(child_pid, ()))
+            try:
+                yield psutil.Process(child_pid)
+            except psutil.NoSuchProcess:
+                continue
+
+    def check_workers_status(self, children_of: dict[int, list[int]]):
         status = {"total": len(self.workers), "failed": 0, "busy": 0, "hanging": 0}
+        hanging_children = []
         for i, worker in enumerate(self.workers):
             if not worker.is_alive():
                 logger.error(f"Worker process {worker.worker_id} stopped, restarting...")
@@ -105,7 +155,11 @@ class WorkerMonitor(ThreadWorker):
                 self.workers[i] = new_worker
                 status["failed"] += 1
             else:
-                self.check_worker_activity(worker, status)
+                self.check_worker_activity(worker, status, children_of, hanging_children)
+
+        # Signal every hanging child of this tick first so their exits overlap in a single wait
+        if hanging_children:
+            self.terminate_processes(hanging_children)
 
         return status
 
@@ -125,32 +179,51 @@ class WorkerMonitor(ThreadWorker):
             return False
 
     @staticmethod
-    def terminate_process(proc):
-        try:
-            proc.terminate()
-            proc.wait(timeout=1)
-        except (psutil.NoSuchProcess, psutil.TimeoutExpired):
+    def terminate_processes(procs: list[psutil.Process]) -> list[psutil.Process]:
+        r"""Terminate processes together, killing any that outlive a shared grace period."""
+        for proc in procs:
+            try:
+                proc.terminate()
+            except psutil.NoSuchProcess:
+                continue  # already exited
+            except psutil.AccessDenied as e:
+                logger.error(f"Terminate failed for {proc.pid}: {str(e)}")
+
+        _, alive = psutil.wait_procs(procs, timeout=1)
+        for proc in alive:
             try:
                 proc.kill()
-                proc.wait(timeout=1)
-            except Exception as e:
+            except psutil.NoSuchProcess:
+                continue  # already exited
+            except psutil.AccessDenied as e:
                 logger.error(f"Kill failed for {proc.pid}: {str(e)}")
-                return False
-        return True
 
-    def check_worker_activity(self, worker: JudgeWorker, status: dict):
+        _, alive = psutil.wait_procs(alive, timeout=1)
+        for proc in alive:
+            logger.error(f"Kill failed for {proc.pid}")
+        return alive
+
+    def check_worker_activity(
+        self,
+        worker: JudgeWorker,
+        status: dict,
+        children_of: dict[int, list[int]],
+        hanging_children: list[psutil.Process],
+    ):
         try:
-            worker_process = psutil.Process(worker.pid)
             is_busy = is_hanging = 0
-            for child in worker_process.children(recursive=True):
+            for child in self.iter_descendants(worker.pid, children_of):
                 is_busy = 1
-                if (
-                    self.check_running(child)
-                    and time.time() - child.create_time() > settings.MAX_TASK_EXECUTION_TIME
-                ):
+                # Coalesce the procfs reads of status() and create_time() into one pass
+                with child.oneshot():
+                    is_overdue = (
+                        self.check_running(child)
+                        and time.time() - child.create_time() > settings.MAX_TASK_EXECUTION_TIME
+                    )
+                if is_overdue:
                     is_hanging = 1
                     logger.warning(f"Worker process {worker.worker_id} has a hanging child process")
-                    self.terminate_process(child)
+                    hanging_children.append(child)
 
             status["busy"] += is_busy
             status["hanging"] += is_hanging
@@ -178,58 +251,120 @@ class TaskRecovery(AsyncThreadWorker):
         if length != 0:
             return
 
-        recovered = 0
+        lost_tasks = []
         task_keys = await RedisManager.keys(RedisQueue.TASKS)
         for key in task_keys:
             task_info = await RedisManager.get_hash_fields(key, ["status", "submitted_at", "data"])
             status = task_info.get("status")
-            current_time = float(time.time())
+            # Timestamps are integer milliseconds, a missing one means the task is not overdue
+            current_time = RedisManager.timestamp()
+            submitted_at = int(task_info.get("submitted_at", current_time))
             if (
                 status == JudgeStatus.PENDING
                 and length == 0
-                and current_time - float(task_info.get("submitted_at", float("inf"))) > 5.0
-            ) or (
-                status == JudgeStatus.RUNNING
-                and current_time - float(task_info.get("running_at", float("inf")))
-                > settings.MAX_TASK_EXECUTION_TIME
+                and current_time - submitted_at > 5_000
             ):
-                key = key.decode("utf-8").split(":")[-1].split("-")[0]
-                logger.warning(f"Detected lost pending task: {key}!")
-                recovered += 1
-                await self.recover_task(key, task_info.get("data"))
-
-        if recovered > 0:
-            logger.info(f"Recovered {recovered} lost or hanging tasks")
-
-    async def recover_task(self, task_id: str, task_data: dict):
-        if task_data:
-            await RedisManager.push(RedisQueue.SUBMISSIONS, task_data)
-            logger.info(f"Task {task_id.split(':')[-1]} has been re-queued")
-        else:
-            error_result = JudgeResult(
-                status=JudgeStatus.SYSTEM_ERROR,
-                error_message="Task lost and cannot be recovered",
-                task_id=task_id,
-            )
+                task_id = _task_id_from_key(key)
+                logger.warning(f"Detected lost pending task: {task_id.split('-', 1)[0]}!")
+                lost_tasks.append((task_id, task_info.get("data")))
+
+        if lost_tasks:
+            await self.recover_tasks(lost_tasks)
+            logger.info(f"Recovered {len(lost_tasks)} lost tasks")
+
+    async def recover_tasks(self, lost_tasks: list[tuple[str, str | None]]):
+        r"""Requeue lost tasks in one push and report unrecoverable ones in one pipeline."""
+        requeued = [(task_id, task_data) for task_id, task_data in lost_tasks if task_data]
+        unrecoverable = [task_id for task_id, task_data in lost_tasks if not task_data]
+
+        if requeued:
             await RedisManager.push(
-                RedisManager.queue(RedisQueue.RESULTS, task_id), error_result.model_dump_json()
+                RedisQueue.SUBMISSIONS, *(task_data for _, task_data in requeued)
             )
-            logger.warning(f"Failed to recover task {task_id}, marked as error")
+            for task_id, _ in requeued:
+                logger.info(f"Task {task_id} has been re-queued")
+
+        if unrecoverable:
+            error_results = [
+                (
+                    RedisManager.queue(RedisQueue.RESULTS, task_id),
+                    JudgeResult(
+                        status=JudgeStatus.SYSTEM_ERROR,
+                        error_message="Task lost and cannot be recovered",
+                        task_id=task_id,
+                    ).model_dump_json(),
+                )
+                for task_id in unrecoverable
+            ]
+            await RedisManager.push_many(error_results)
+            for task_id in unrecoverable:
+                logger.warning(f"Failed to recover task {task_id}, marked as error")
 
 
 class RedisCleanup(AsyncThreadWorker):
-    r"""Cleans up expired keys in Redis."""
+    r"""Cleans up expired keys in Redis.
+
+    Result queues of expired tasks are removed as soon as Redis announces the expiry; the
+    periodic keyspace sweep only catches what the events missed.
+    """
 
     def __init__(self, interval: float = 300.0):
         super().__init__(interval=interval, name="redis-cleanup")
         self.batch_size = 1000
+        self.pubsub = None
+        self.task_prefix = RedisManager.prefix(RedisQueue.TASKS).encode("utf-8")
+        self.result_pattern = RedisManager.pattern(RedisQueue.RESULTS)
+
+    def wait(self) -> bool:
+        deadline = time.monotonic() + self.interval
+        try:
+            self.loop.run_until_complete(self.consume_expiry_events(deadline))
+        except Exception as e:
+            logger.error(f"Error consuming expiry events in worker {self.name}: {str(e)}")
+            # Release the broken subscription so the next tick does not leak a connection
+            self.close_pubsub()
+            return self.exit_event.wait(max(0.0, deadline - time.monotonic()))
+        return self.exit_event.is_set()
+
+    def close_pubsub(self):
+        if self.pubsub is not None:
+            try:
+                self.loop.run_until_complete(self.pubsub.reset())
+            except Exception as e:
+                logger.error(f"Error closing pubsub in worker {self.name}: {str(e)}")
+            self.pubsub = None
+
+    def shutdown_loop(self):
+        self.close_pubsub()
+        super().shutdown_loop()
+
+    async def consume_expiry_events(self, deadline: float):
+        r"""Drop the result queues of expired tasks as expiry events arrive, until the deadline."""
+        if self.pubsub is None:
+            self.pubsub = await RedisManager.subscribe(RedisManager.expired_channel())
+
+        while self.running and (remaining := deadline - time.monotonic()) > 0:
+            message = await self.pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=min(remaining, 1.0)
+            )
+            # Drain whatever else is already buffered so the deletes go out as one batch
+            result_keys = []
+            while message is not None:
+                if message["data"].startswith(self.task_prefix):
+                    task_id = _task_id_from_key(message["data"])
+                    result_keys.append(RedisManager.queue(RedisQueue.RESULTS, task_id))
+                if len(result_keys) >= self.batch_size:
+                    break
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+
+            if result_keys:
+                await RedisManager.unlink(result_keys)
 
     async def async_execute(self):
-        deleted_count = await self.cleanup_keys(
-            RedisManager.pattern(RedisQueue.TASKS), self.is_expired_task
-        )
-        orphaned_count = await self.cleanup_keys(
-            RedisManager.pattern(RedisQueue.RESULTS), self.is_orphaned_result
+        # The two sweeps touch disjoint keyspaces, so let their round trips overlap
+        deleted_count, orphaned_count = await asyncio.gather(
+            self.cleanup_expired_tasks(),
+            self.cleanup_keys(self.result_pattern, self.are_orphaned_results),
         )
 
         if deleted_count > 0 or orphaned_count > 0:
@@ -238,7 +373,25 @@ class RedisCleanup(AsyncThreadWorker):
                 f"and {orphaned_count} orphaned result queues"
             )
 
-    async def cleanup_keys(self, pattern: str, filter_func: callable) -> int:
+    async def cleanup_expired_tasks(self) -> int:
+        r"""Drop tasks past the expiry time by range-querying the submission-time index."""
+        deleted_count = 0
+        cutoff = RedisManager.timestamp() - settings.RESULT_EXPIRY_TIME * 1000
+
+        while True:
+            task_ids = await RedisManager.tasks_submitted_before(cutoff, count=self.batch_size)
+            if not task_ids:
+                break
+
+            await RedisManager.drop_tasks(task_ids)
+            deleted_count += len(task_ids)
+
+            if len(task_ids) < self.batch_size:
+                break
+
+        return deleted_count
+
+    async def cleanup_keys(self, pattern: str, filter_batch: callable) -> int:
         deleted_count = cursor = 0
 
         while True:
@@ -248,10 +401,11 @@ class RedisCleanup(AsyncThreadWorker):
                     break
                 continue
 
-            keys_to_delete = [key for key in keys if await filter_func(key)]
+            flags = await filter_batch(keys)
+            keys_to_delete = [key for key, flag in zip(keys, flags, strict=True) if flag]
 
             if keys_to_delete:
-                await RedisManager.delete(keys_to_delete)
+                await RedisManager.unlink(keys_to_delete)
                 deleted_count += len(keys_to_delete)
 
             if cursor == 0:
@@ -259,11 +413,6 @@ class RedisCleanup(AsyncThreadWorker):
 
         return deleted_count
 
-    async def is_expired_task(self, key: str) -> bool:
-        task_info = await RedisManager.get_hash_fields(key, ["submitted_at"])
-        submitted_at = float(task_info.get("submitted_at", 0))
-        return time.time() - submitted_at > settings.RESULT_EXPIRY_TIME
-
-    async def is_orphaned_result(self, key: str) -> bool:
-        task_key = RedisManager.queue(RedisQueue.TASKS, key)
-        return not await RedisManager.exists(task_key)
+    async def are_orphaned_results(self, keys: list[bytes]) -> list[bool]:
+        task_keys = [RedisManager.queue(RedisQueue.TASKS, _task_id_from_key(key)) for key in keys]
+        return [not found for found in await RedisManager.exists_many(task_keys)]
@@ -7,24 +7,27 @@ It supports multiple data sources and provides detailed statistics on solution p
 """
 
 import argparse
-import asyncio
+import heapq
 import json
 import os
 import random
-import time
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from typing import Any
 
+import numpy as np
 from datasets import load_dataset
 from rich.console import Console
 
 from scripts.pbar import get_progress_bar
 from scripts.utils import (
+    DEFAULT_CONCURRENCY,
     Submission,
-    dump_failed_result,
     extract_code,
     print_stress_test_summary,
     process_all_submissions,
+    run_async,
 )
 
 # Configuration constants
@@ -39,15 +42,7 @@ MAX_CODE_LENGTH = 65536
 MAX_TEST_CASES = 64
 MAX_SOLUTIONS = 1
 RESULTS_DIR = "results"
-
-
-@dataclass
-class ProblemStats:
-    r"""Track statistics for each problem."""
-
-    passed: bool = False
-    solution_count: int = 0
-    passed_solutions: int = 0
+PREPROCESS_WINDOW = 4  # samples in flight per preprocessing worker
 
 
 def parse_str(input_value: Any) -> str:
@@ -58,25 +53,37 @@ def parse_str(input_value: Any) -> str:
 
 
 def get_solutions(solutions: list[str]) -> list[str]:
-    r"""Extract and filter valid solutions from raw solution text."""
-    valid_solutions = []
+    r"""Extract and filter valid, distinct solutions from raw solution text."""
+    # A dict keeps the first occurrence of each solution in order
+    valid_solutions = {}
     for solution in solutions:
         code = extract_code(solution)
         if code and len(code) <= MAX_CODE_LENGTH:
-            valid_solutions.append(code)
-    return valid_solutions[:MAX_SOLUTIONS]
+            valid_solutions[code] = None
+            if len(valid_solutions) >= MAX_SOLUTIONS:
+                break
+    return list(valid_solutions)
+
+
+def input_size(test: dict) -> int:
+    r"""Length of a test's input, only stringifying inputs that are not already strings."""
+    value = test["input"]
+    return len(value) if isinstance(value, str) else len(str(value))
 
 
 def get_tests(tests: list[dict], k: int = 10, m: int = 20, n: int = 30) -> list[dict]:
     r"""Select k shortest, m longest, and n random tests from remaining."""
     if len(tests) <= k + m + n:
         return tests
-    tests = sorted(tests, key=lambda t: len(str(t["input"])))
-    shortest = tests[:k]
-    longest = tests[-m:] if m else []
-    remaining = tests[k:-m] if m else tests[k:]
-    return (
-        shortest + longest + (random.sample(remaining, min(n, len(remaining))) if remaining else [])
+    # Select the extremes with bounded heaps instead of sorting everything, the index breaks
+    # ties so the test dicts themselves are never compared
+    keyed = [(input_size(test), i) for i, test in enumerate(tests)]
+    extremes = [i for _, i in heapq.nsmallest(k, keyed)]
+    extremes += [i for _, i in reversed(heapq.nlargest(m, keyed))]
+    picked = set(extremes)
+    remaining = [test for i, test in enumerate(tests) if i not in picked]
+    return [tests[i] for i in extremes] + (
+        random.sample(remaining, min(n, len(remaining))) if remaining else []
     )
 
 
@@ -116,21 +123,20 @@ def prepare_primeintellect_tests(tests: list[dict]) -> tuple[str, list[dict], st
 
 
 def create_submissions(
-    sample: dict, sample_idx: int, args: argparse.Namespace
-) -> tuple[dict[str, Submission], dict[int, ProblemStats]]:
-    r"""Create submissions from a dataset sample."""
+    sample: dict, sample_idx: int, source: str
+) -> tuple[dict[tuple[int, int], Submission], int]:
+    r"""Create submissions from a dataset sample, runs in a preprocessing worker process."""
     submissions = {}
-    problem_stats = {}
 
     solutions = get_solutions(sample["solutions"])
     if not solutions:
-        return submissions, problem_stats
+        return submissions, 0
 
     tests = json.loads(sample["tests"])
 
-    if args.source == "taco":
+    if source == "taco":
         mode, test_cases, entry_point = prepare_taco_tests(tests)
-    elif args.source == "primeintellect":
+    elif source == "primeintellect":
         mode, test_cases, entry_point = prepare_primeintellect_tests(tests)
     else:
         # Default assumption for other datasets
@@ -140,22 +146,16 @@ def create_submissions(
 
     test_cases = get_tests(test_cases)
 
-    # Initialize problem stats
-    problem_stats[sample_idx] = ProblemStats(
-        solution_count=len(solutions),
-    )
-
     # Create submissions for each solution
     for sol_idx, solution in enumerate(solutions):
-        submission_id = f"{sample_idx}-{sol_idx}"
-        submissions[submission_id] = Submission(
+        submissions[(sample_idx, sol_idx)] = Submission(
             code=solution,
             mode=mode,
             test_cases=test_cases,
             entry_point=entry_point,
         )
 
-    return submissions, problem_stats
+    return submissions, len(solutions)
 
 
 def parse_args() -> argparse.Namespace:
@@ -169,38 +169,59 @@ def parse_args() -> argparse.Namespace:
         help="Dataset source to evaluate",
     )
     parser.add_argument("--samples", type=int, default=512, help="Maximum number of samples")
-    parser.add_argument("--workers", type=int, default=128, help="Maximum number of workers")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of concurrent requests",
+    )
+    parser.add_argument(
+        "--dedup", action="store_true", help="Judge identical submissions only once"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the statistics as JSON lines")
     return parser.parse_args()
 
 
-def update_stats(results: list[tuple[str, dict]], problem_stats: dict[int, ProblemStats]) -> None:
-    r"""Update problem statistics based on evaluation results."""
-    for submission_id, result in results:
-        if result.get("status") == "accepted":
-            problem_idx = int(submission_id.split("-")[0])
-            problem_stats[problem_idx].passed = True
-            problem_stats[problem_idx].passed_solutions += 1
+def update_stats(results: list[tuple[tuple[int, int], dict]], num_problems: int) -> np.ndarray:
+    r"""Count the accepted solutions of each problem."""
+    # Submission ids are (problem index, solution index) pairs
+    accepted = [
+        submission_id[0] for submission_id, result in results if result.get("status") == "accepted"
+    ]
+    return np.bincount(np.asarray(accepted, dtype=np.intp), minlength=num_problems)
 
 
 def print_stats(
-    problem_stats: dict[int, ProblemStats],
+    solution_counts: np.ndarray,
+    passed_counts: np.ndarray,
     total_time: float,
     results: list,
     submissions_count: int,
     console: Console,
+    as_json: bool = False,
 ) -> None:
     r"""Print evaluation statistics."""
-    # Calculate pass rates
-    total_problems = len(problem_stats)
-    passed_problems = sum(1 for stats in problem_stats.values() if stats.passed)
+    # Calculate pass rates, problems without a valid solution are not evaluated
+    total_problems = int(np.count_nonzero(solution_counts))
+    passed_problems = int(np.count_nonzero(passed_counts))
     pass_rate = passed_problems / total_problems if total_problems > 0 else 0
 
-    total_solutions = sum(stats.solution_count for stats in problem_stats.values())
-    passed_solutions = sum(stats.passed_solutions for stats in problem_stats.values())
+    total_solutions = int(solution_counts.sum())
+    passed_solutions = int(passed_counts.sum())
     solution_pass_rate = passed_solutions / total_solutions if total_solutions > 0 else 0
 
     # Print summary
-    print_stress_test_summary(results, total_time, submissions_count, console)
+    print_stress_test_summary(results, total_time, submissions_count, console, as_json)
+
+    if as_json:
+        pass_rates = {
+            "passed_problems": passed_problems,
+            "total_problems": total_problems,
+            "passed_solutions": passed_solutions,
+            "total_solutions": total_solutions,
+        }
+        console.out(json.dumps(pass_rates), highlight=False)
+        return
 
     console.print(
         f"\n[bold]Problem Pass Rate:[/bold] {passed_problems}/{total_problems} ({pass_rate:.2%})"
@@ -216,47 +237,64 @@ def main() -> None:
     console = Console()
     args = parse_args()
 
-    # Load dataset
-    ds = load_dataset(DATASET_NAME, args.source, split=SPLITS[args.source])
-
-    # Adjust sample count
-    args.samples = min(max(args.samples, -1), len(ds))
-    if args.samples < 0:
-        args.samples = len(ds)
+    # Stream the dataset so only the rows we evaluate are downloaded and decoded
+    ds = load_dataset(DATASET_NAME, args.source, split=SPLITS[args.source], streaming=True)
+    # Only ship the columns preprocessing reads to the worker processes
+    ds = ds.select_columns(["solutions", "tests"])
+    if args.samples >= 0:
+        ds = ds.take(args.samples)
 
     submissions = {}
-    problem_stats = {}
-
-    # Prepare submissions
-    with get_progress_bar() as pbar:
-        task = pbar.add_task("Preprocessing", total=args.samples)
-        for idx, sample in enumerate(ds):
-            if idx >= args.samples:
-                break
-
-            sample_submissions, sample_stats = create_submissions(sample, idx, args)
-            submissions.update(sample_submissions)
-            problem_stats.update(sample_stats)
+    # Indexed by sample position, futures are consumed in submission order
+    solution_counts = []
+
+    # Prepare submissions, spreading the regex and JSON heavy work across processes
+    workers = os.cpu_count()
+    samples = enumerate(ds)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only a bounded window is read ahead, so streaming still stops early. The first window
+        # is submitted before the progress bar starts, so workers fork before its refresh thread
+        pending = deque(
+            executor.submit(create_submissions, sample, idx, args.source)
+            for idx, sample in islice(samples, PREPROCESS_WINDOW * workers)
+        )
+        with get_progress_bar() as pbar:
+            task = pbar.add_task("Preprocessing", total=args.samples if args.samples >= 0 else None)
+            while pending:
+                sample_submissions, solution_count = pending.popleft().result()
+                for idx, sample in islice(samples, 1):
+                    pending.append(executor.submit(create_submissions, sample, idx, args.source))
+                submissions.update(sample_submissions)
+                solution_counts.append(solution_count)
 
-            pbar.update(task, advance=1)
+                pbar.update(task, advance=1)
 
     # Run evaluation
-    benchmark_start = time.time()
-    submission_dicts = {
-        k: {key: getattr(v, key) for key in v.__dataclass_fields__} for k, v in submissions.items()
-    }
-    results = asyncio.run(process_all_submissions(submission_dicts))
-    benchmark_end = time.time()
-    total_time = benchmark_end - benchmark_start
+    # Submission is a plain dataclass, its instance __dict__ already holds every field
+    submission_dicts = ((k, v.__dict__) for k, v in submissions.items())
+    result_file = f"{RESULTS_DIR}/deepcoder-{args.source}-{args.samples}.txt"
+    results, total_time = run_async(
+        process_all_submissions(
+            submission_dicts,
+            total=len(submissions),
+            concurrency=args.workers,
+            failed_path=result_file,
+            deduplicate=args.dedup,
+        )
+    )
 
     # Update and print statistics
-    update_stats(results, problem_stats)
-    print_stats(problem_stats, total_time, results, len(submissions), console)
-
-    # Save results
-    os.makedirs(RESULTS_DIR, exist_ok=True)
-    result_file = f"{RESULTS_DIR}/deepcoder-{args.source}-{args.samples}.txt"
-    dump_failed_result(results, submissions, result_file)
+    solution_counts = np.asarray(solution_counts, dtype=np.int32)
+    passed_counts = update_stats(results, len(solution_counts))
+    print_stats(
+        solution_counts,
+        passed_counts,
+        total_time,
+        results,
+        len(submissions),
+        console,
+        args.json,
+    )
 
 
 if __name__ == "__main__":
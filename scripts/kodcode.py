@@ -1,37 +1,31 @@
 import argparse
 import ast
-import asyncio
-import json
-import os
-import time
+import re
+from collections.abc import Iterable, Iterator
 
 from datasets import load_dataset
 from rich.console import Console
 
 from scripts.utils import (
+    DEFAULT_CONCURRENCY,
     EMPTY_TEST_CASES,
-    dump_failed_result,
     print_stress_test_summary,
     process_all_submissions,
+    run_async,
 )
 
 KODCODE_TIME_LIMIT = 30
 KODCODE_MEMORY_LIMIT = 4 * 1024
+_SOLUTION_IMPORT_RE = re.compile(r"^from solution import .*\n?", re.MULTILINE)
+_TEST_DEF_RE = re.compile(r"^def (test_\w+)\s*\(", re.MULTILINE)
 
 
 def format_unit_test(test: str) -> str:
-    lines = test.split("\n")
-    processed_lines = [line for line in lines if not line.startswith("from solution import ")]
-    test_functions = []
-    for line in lines:
-        if line.startswith("def test_"):
-            func_name = line.split("(")[0][4:]
-            test_functions.append(func_name)
-    new_content = "\n".join(processed_lines)
+    new_content = _SOLUTION_IMPORT_RE.sub("", test)
+    test_functions = _TEST_DEF_RE.findall(test)
     if test_functions:
         new_content += '\n\nif __name__ == "__main__":\n'
-        for func in test_functions:
-            new_content += f"    {func}()\n"
+        new_content += "".join(f"    {func}()\n" for func in test_functions)
     return new_content
 
 
@@ -54,10 +48,44 @@ def format_test_cases(test: dict) -> str:
     return test_cases
 
 
+def iter_submissions(ds: Iterable[dict], samples: float) -> Iterator[tuple[str, dict]]:
+    r"""Lazily build up to samples submissions, so judging starts while the rest are prepared."""
+    count = 0
+    for sample in ds:
+        try:
+            if sample.get("style") == "online_judge":
+                code = sample.get("solution")
+                mode = "acm"
+                test_cases = format_test_cases(ast.literal_eval(sample.get("test")))
+            else:
+                code = format_full_code(sample)
+                mode = "fullcode"
+                test_cases = EMPTY_TEST_CASES
+        except Exception as e:
+            print(f"Error processing sample {sample.get('question_id')}: {e}")
+            continue
+        submission = {
+            "code": code,
+            "language": "python",
+            "mode": mode,
+            "test_cases": test_cases,
+            "time_limit": KODCODE_TIME_LIMIT,
+            "memory_limit": KODCODE_MEMORY_LIMIT,
+        }
+        yield sample.get("question_id"), submission
+        count += 1
+        if count >= samples:
+            break
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--samples", type=int, default=512, help="max samples")
-    parser.add_argument("--workers", type=int, default=128, help="max workers")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_CONCURRENCY, help="max concurrent requests"
+    )
+    parser.add_argument("--dedup", action="store_true", help="judge identical submissions once")
+    parser.add_argument("--json", action="store_true", help="print the summary as one JSON line")
     parser.add_argument(
         "--subset",
         type=str,
@@ -83,52 +111,26 @@ def parse_args():
 def main():
     args = parse_args()
     console = Console()
-    ds = load_dataset("KodCode/KodCode-V1", split="train", trust_remote_code=True)
-    ds = ds.filter(lambda x: x.get("style") == "online_judge", num_proc=os.cpu_count())
-    # ds = ds.filter(lambda x: x.get("subset") == args.subset, num_proc=os.cpu_count())
+    # Stream and filter lazily so the loop below stops reading once it has enough samples
+    ds = load_dataset("KodCode/KodCode-V1", split="train", streaming=True, trust_remote_code=True)
+    ds = ds.filter(lambda x: x.get("style") == "online_judge")
+    # ds = ds.filter(lambda x: x.get("subset") == args.subset)
     if args.samples < 0:
         args.samples = float("inf")
 
-    submissions = {}
-    samples = {}
-    for sample in ds:
-        samples[sample.get("question_id")] = sample
-        try:
-            if sample.get("style") == "online_judge":
-                code = sample.get("solution")
-                mode = "acm"
-                test_cases = format_test_cases(ast.literal_eval(sample.get("test")))
-            else:
-                code = format_full_code(sample)
-                mode = "fullcode"
-                test_cases = EMPTY_TEST_CASES
-        except Exception as e:
-            print(f"Error processing sample {sample.get('question_id')}: {e}")
-            continue
-        submission = {
-            "code": code,
-            "language": "python",
-            "mode": mode,
-            "test_cases": test_cases,
-            "time_limit": KODCODE_TIME_LIMIT,
-            "memory_limit": KODCODE_MEMORY_LIMIT,
-        }
-        submissions[sample.get("question_id")] = submission
-        if len(submissions) >= args.samples:
-            break
-
-    benchmark_start = time.time()
-    results = asyncio.run(process_all_submissions(submissions))
-    benchmark_end = time.time()
-    total_time = benchmark_end - benchmark_start
-
-    for _, result in results[:10]:
-        if result.get("status") != "accepted":
-            print(json.dumps(result, indent=4))
+    failed_path = f"results/kodcode-{args.samples}.txt"
+    total = args.samples if args.samples != float("inf") else None
+    results, total_time = run_async(
+        process_all_submissions(
+            iter_submissions(ds, args.samples),
+            total=total,
+            concurrency=args.workers,
+            failed_path=failed_path,
+            deduplicate=args.dedup,
+        )
+    )
 
-    print_stress_test_summary(results, total_time, len(submissions), console)
-    os.makedirs("results", exist_ok=True)
-    dump_failed_result(results, submissions, f"results/kodcode-{args.samples}.txt")
+    print_stress_test_summary(results, total_time, len(results), console, args.json)
 
 
 if __name__ == "__main__":
@@ -1,16 +1,16 @@
 import argparse
-import asyncio
-import json
-import time
+from collections.abc import Iterable, Iterator
+from typing import Any
 
 from datasets import load_dataset
 from rich.console import Console
 
 from scripts.utils import (
+    DEFAULT_CONCURRENCY,
     EMPTY_TEST_CASES,
-    dump_failed_result,
     print_stress_test_summary,
     process_all_submissions,
+    run_async,
 )
 
 LEETCODE_TIME_LIMIT = 30
@@ -28,46 +28,56 @@ def format_full_code(sample: dict) -> str:
     return code
 
 
+def format_fullcode_submission(sample: dict) -> dict:
+    return {
+        "code": format_full_code(sample),
+        "language": "python",
+        "mode": "fullcode",
+        "test_cases": EMPTY_TEST_CASES,
+        "time_limit": LEETCODE_TIME_LIMIT,
+        "memory_limit": LEETCODE_MEMORY_LIMIT,
+    }
+
+
+def iter_submissions(ds: Iterable[dict], samples: int) -> Iterator[tuple[Any, dict]]:
+    r"""Lazily build up to samples submissions, so judging starts while the rest are prepared."""
+    count = 0
+    for sample in ds:
+        yield sample.get("task_id"), format_fullcode_submission(sample)
+        count += 1
+        if count >= samples:
+            break
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--samples", type=int, default=512, help="max samples")
-    parser.add_argument("--workers", type=int, default=128, help="max workers")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_CONCURRENCY, help="max concurrent requests"
+    )
+    parser.add_argument("--dedup", action="store_true", help="judge identical submissions once")
+    parser.add_argument("--json", action="store_true", help="print the summary as one JSON line")
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
     console = Console()
-    ds = load_dataset("newfacade/LeetCodeDataset", split="train", trust_remote_code=True)
-
-    submissions = {}
-    samples = {}
-    for sample in ds:
-        samples[sample.get("task_id")] = sample
-        code = format_full_code(sample)
-        submission = {
-            "code": code,
-            "language": "python",
-            "mode": "fullcode",
-            "test_cases": EMPTY_TEST_CASES,
-            "time_limit": LEETCODE_TIME_LIMIT,
-            "memory_limit": LEETCODE_MEMORY_LIMIT,
-        }
-        submissions[sample.get("task_id")] = submission
-        if len(submissions) >= args.samples:
-            break
-
-    benchmark_start = time.time()
-    results = asyncio.run(process_all_submissions(submissions))
-    benchmark_end = time.time()
-    total_time = benchmark_end - benchmark_start
+    ds = load_dataset(
+        "newfacade/LeetCodeDataset", split="train", streaming=True, trust_remote_code=True
+    )
 
-    for _, result in results:
-        if result.get("status") != "accepted":
-            print(json.dumps(result, indent=4))
+    results, total_time = run_async(
+        process_all_submissions(
+            iter_submissions(ds, args.samples),
+            total=args.samples,
+            concurrency=args.workers,
+            failed_path=f"results/leetcode-{args.samples}.txt",
+            deduplicate=args.dedup,
+        )
+    )
 
-    print_stress_test_summary(results, total_time, len(submissions), console)
-    dump_failed_result(results, submissions, f"results/leetcode-{args.samples}.txt")
+    print_stress_test_summary(results, total_time, len(results), console, args.json)
 
 
 if __name__ == "__main__":
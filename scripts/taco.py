@@ -1,24 +1,31 @@
 import argparse
-import asyncio
 import json
-import os
-import time
+import re
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
 from typing import Any
 
 from datasets import load_dataset
 from rich.console import Console
 
 from scripts.utils import (
+    DEFAULT_CONCURRENCY,
     EMPTY_TEST_CASES,
     check_code_with_ast,
-    dump_failed_result,
     extract_memory_limit,
     extract_time_limit,
     print_stress_test_summary,
     process_all_submissions,
+    run_async,
 )
 
 MAX_CODE_LENGTH = 32768
+# Opening lines of C++, C#, Java and Go sources. A package clause has to be a whole
+# declaration, so Python code starting with `package = ...` is not rejected
+_NON_PYTHON_RE = re.compile(
+    r"\s*(?:#include|using namespace|import java|public class|package\s+[\w.]+\s*;?\s*$)",
+    re.MULTILINE,
+)
 MODE_MAP = {
     "codeforces": "acm",
     "aizu": "acm",
@@ -35,82 +42,82 @@ _inputs = {inputs}
 _outputs = {outputs}
 import math
 def _deep_eq(a, b, tol=1e-5):
-    if isinstance(a, float) or isinstance(b, float):
-        return math.isclose(a, b, rel_tol=tol, abs_tol=tol)
-    if isinstance(a, (list, tuple)):
-        if len(a) != len(b): return False
-        return all(_deep_eq(x, y, tol) for x, y in zip(a, b))
-    return a == b
+    stack = [(a, b)]
+    while stack:
+        x, y = stack.pop()
+        if x == y:
+            continue
+        if isinstance(x, float) or isinstance(y, float):
+            if not math.isclose(x, y, rel_tol=tol, abs_tol=tol): return False
+        elif isinstance(x, (list, tuple)):
+            if not isinstance(y, (list, tuple)) or len(x) != len(y): return False
+            # Reversed so pairs pop left to right and the first mismatch still short-circuits
+            stack.extend(zip(reversed(x), reversed(y)))
+        else:
+            return False
+    return True
 
 for i, o in zip(_inputs, _outputs):
 """
 
 
+# Bounded, so a long streaming run keeps only the most recent verdicts alive
+@lru_cache(maxsize=8192)
+def is_valid_code(code: str) -> bool:
+    r"""Check a solution once per distinct source, reusing the verdict for duplicates."""
+    return check_code_with_ast(code)
+
+
 def get_solution(solutions: list[str]) -> str | None:
     for solution in solutions:
         if len(solution) > MAX_CODE_LENGTH:
             continue
-        if check_code_with_ast(solution):
+        # Solutions in other languages are rejected from their opening line, before the safety check
+        if _NON_PYTHON_RE.match(solution):
+            continue
+        if is_valid_code(solution):
             return solution
     return None
 
 
-def get_codewars_code(code: str, inputs: list[Any], outputs: list[Any], entry_point: str) -> str:
-    code += f"\n{TEST_CODE.format(inputs=inputs, outputs=outputs)}"
-    code += f"    assert _deep_eq({entry_point}(*i), o[0])\n"
-    return code
+# Split once so rendering is plain concatenation around a single repr of each test list
+_TEST_HEAD, _, _TEST_REST = TEST_CODE.partition("{inputs}")
+_TEST_MID, _, _TEST_TAIL = _TEST_REST.partition("{outputs}")
 
 
-def get_codechef_test_cases(inputs: list[Any], outputs: list[Any]) -> list[dict]:
-    _inputs = []
-    _outputs = []
-    for inp in inputs:
-        if isinstance(inp, list):
-            _inputs.append("\n".join(map(str, inp)))
-        else:
-            _inputs.append(str(inp))
-    for o in outputs:
-        if isinstance(o, list):
-            _outputs.append("\n".join(map(str, o)))
-        else:
-            _outputs.append(str(o))
-    return _inputs, _outputs
+def build_test_block(inputs: list[Any], outputs: list[Any], entry_point: str) -> str:
+    r"""Render the assertion harness for a problem, independent of the solution under test."""
+    return "".join(
+        (
+            _TEST_HEAD,
+            repr(inputs),
+            _TEST_MID,
+            repr(outputs),
+            _TEST_TAIL,
+            f"    assert _deep_eq({entry_point}(*i), o[0])\n",
+        )
+    )
 
 
-def parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "--source",
-        type=str,
-        default="codeforces",
-        choices=[
-            "codeforces",
-            "aizu",
-            "codewars",
-            "codechef",
-            "atcoder",
-            "hackerrank",
-            "hackerearth",
-        ],
-    )
-    parser.add_argument("--samples", type=int, default=512, help="max samples")
-    parser.add_argument("--workers", type=int, default=128, help="max workers")
-    return parser.parse_args()
+def get_codewars_code(code: str, inputs: list[Any], outputs: list[Any], entry_point: str) -> str:
+    return "\n".join((code, build_test_block(inputs, outputs, entry_point)))
 
 
-def main():
-    args = parse_args()
-    console = Console()
-    ds = load_dataset("likaixin/TACO-verified", split="train", trust_remote_code=True)
+def _format_test_value(value: Any) -> str:
+    # Decoded JSON only yields plain lists, so the exact type check is enough
+    return "\n".join(map(str, value)) if type(value) is list else str(value)
 
-    submissions = {}
-    for sample in ds:
-        # step 1: filter by source
-        if sample.get("source") != args.source:
-            continue
 
+def get_codechef_test_cases(inputs: list[Any], outputs: list[Any]) -> list[dict]:
+    return [_format_test_value(inp) for inp in inputs], [_format_test_value(o) for o in outputs]
+
+
+def iter_submissions(ds: Iterable[dict], source: str, samples: int) -> Iterator[tuple[Any, dict]]:
+    r"""Lazily build up to samples submissions, so judging starts while the rest are prepared."""
+    count = 0
+    for sample in ds:
         # step 2: get mode
-        mode = MODE_MAP.get(args.source)
+        mode = MODE_MAP.get(source)
 
         # step 3: get solution
         code = get_solution(sample.get("solutions"))
@@ -118,14 +125,15 @@ def main():
             continue
 
         # step 4: get test cases
+        # stdlib json keeps big ints exact, orjson would turn them into floats
         input_output = json.loads(sample.get("input_output"))
         inputs, outputs = input_output.get("inputs"), input_output.get("outputs")
         if not inputs or not outputs:
             continue
 
-        if args.source == "codewars":
+        if source == "codewars":
             code = get_codewars_code(code, inputs, outputs, input_output.get("fn_name"))
-        elif args.source == "codechef":
+        elif source == "codechef":
             inputs, outputs = get_codechef_test_cases(inputs, outputs)
         if mode == "acm":
             test_cases = [
@@ -146,22 +154,63 @@ def main():
             "time_limit": time_limit,
             "memory_limit": memory_limit,
         }
-        submissions[sample.get("id")] = submission
-        if len(submissions) >= args.samples:
+        yield sample.get("id"), submission
+        count += 1
+        if count >= samples:
             break
 
-    benchmark_start = time.time()
-    results = asyncio.run(process_all_submissions(submissions))
-    benchmark_end = time.time()
-    total_time = benchmark_end - benchmark_start
 
-    for _, result in results:
-        if result.get("status") != "accepted":
-            print(json.dumps(result, indent=4))
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--source",
+        type=str,
+        default="codeforces",
+        choices=[
+            "codeforces",
+            "aizu",
+            "codewars",
+            "codechef",
+            "atcoder",
+            "hackerrank",
+            "hackerearth",
+        ],
+    )
+    parser.add_argument("--samples", type=int, default=512, help="max samples")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_CONCURRENCY, help="max concurrent requests"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1, help="submissions sent per request, 1 disables"
+    )
+    parser.add_argument("--dedup", action="store_true", help="judge identical submissions once")
+    parser.add_argument("--json", action="store_true", help="print the summary as one JSON line")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    console = Console()
+    # step 1: stream and filter by source, reading stops once enough samples are collected
+    ds = load_dataset(
+        "likaixin/TACO-verified", split="train", streaming=True, trust_remote_code=True
+    )
+    ds = ds.filter(lambda sample: sample.get("source") == args.source)
+
+    failed_path = f"results/taco-{args.source}-{args.samples}.txt"
+    submissions = iter_submissions(ds, args.source, args.samples)
+    results, total_time = run_async(
+        process_all_submissions(
+            submissions,
+            total=args.samples,
+            concurrency=args.workers,
+            failed_path=failed_path,
+            batch_size=args.batch_size,
+            deduplicate=args.dedup,
+        )
+    )
 
-    print_stress_test_summary(results, total_time, len(submissions), console)
-    os.makedirs("results", exist_ok=True)
-    dump_failed_result(results, submissions, f"results/taco-{args.source}-{args.samples}.txt")
+    print_stress_test_summary(results, total_time, len(results), console, args.json)
 
 
 if __name__ == "__main__":
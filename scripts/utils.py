@@ -1,5 +1,5 @@
-import ast
 import asyncio
+import hashlib
 import json
 import math
 import os
@@ -7,21 +7,36 @@ import re
 import time
 import warnings
 from collections import Counter
+from collections.abc import Coroutine, Iterable
+from contextlib import nullcontext
 from dataclasses import dataclass, field
-from statistics import mean, median
-from typing import Any
+from typing import Any, BinaryIO
 
 import aiohttp
+import numpy as np
+import orjson
 from rich import box
 from rich.panel import Panel
 from rich.table import Table
 
 from scripts.pbar import get_progress_bar
 
+try:
+    import uvloop
+except ImportError:  # optional, uvloop is not available on every platform
+    uvloop = None
+
 DEFAULT_TIME_LIMIT = 30  # seconds
 DEFAULT_MEMORY_LIMIT = 4 * 1024  # MB
 MIN_MEMORY_LIMIT = 128  # MB
+# Requests in flight, scaled to what the judge server absorbs rather than local cores
+DEFAULT_CONCURRENCY = int(os.environ.get("JUDGE_CONCURRENCY", 256))
 API_BASE_URL = "http://localhost:8000/api/v1/judge"
+BATCH_API_URL = f"{API_BASE_URL}/batch"
+JSON_HEADERS = {"Content-Type": "application/json"}
+SUMMARY_FIELDS = ("status", "request_latency", "execution_time", "memory_usage")
+PERCENTILES = (0.5, 0.75, 0.9, 0.95, 0.99)
+_EXHAUSTED = object()  # next() default marking the end of a submission source
 EMPTY_TEST_CASES = [
     {"input": "", "expected": ""},
 ]
@@ -44,6 +59,8 @@ BLOCK_LIBS = [
     "seaborn",
     "smtpd",
 ]
+# eval/exec calls and blocked libraries as one alternation, matched in a single scan of the code
+_BLOCKED_RE = re.compile("|".join(map(re.escape, ("eval(", "exec(", *BLOCK_LIBS))))
 
 warnings.filterwarnings("ignore", category=SyntaxWarning)
 
@@ -63,26 +80,27 @@ class Submission:
 
 
 def check_code_with_ast(code):
+    # Cheap substring rejects first, so blocked code never reaches the parser
+    if _BLOCKED_RE.search(code):  # Filter out unsafe code and libraries
+        return False
     try:
-        ast.parse(code)
+        # compile() parses too, and also rejects code that only fails at the compiler stage
         compile(code, "<string>", "exec")
-        if "eval(" in code or "exec(" in code:  # Filter out unsafe code
-            return False
-        for lib in BLOCK_LIBS:  # Filter out unsafe libraries
-            if lib in code:
-                return False
         return True
     except SyntaxError:
         return False
 
 
+_NUM_RE = re.compile(r"\d+\.?\d*")
+
+
 def extract_time_limit(time_limit: str | None) -> int:
     if time_limit is None:
         return DEFAULT_TIME_LIMIT
     assert "second" in time_limit
-    numbers = re.findall(r"\d+\.?\d*", time_limit)
+    numbers = _NUM_RE.findall(time_limit)
     if numbers:
-        return math.ceil(max(float(num) for num in numbers)) + 10
+        return math.ceil(max(map(float, numbers))) + 10
     return DEFAULT_TIME_LIMIT
 
 
@@ -90,7 +108,7 @@ def extract_memory_limit(memory_limit: str | None) -> int:
     if memory_limit is None:
         return DEFAULT_MEMORY_LIMIT
     assert "bytes" in memory_limit or "megabytes" in memory_limit
-    number = re.search(r"\d+\.?\d*", memory_limit)
+    number = _NUM_RE.search(memory_limit)
     if number:
         value = float(number.group())
         if "bytes" in memory_limit:
@@ -102,87 +120,244 @@ def extract_memory_limit(memory_limit: str | None) -> int:
 CODE_PATTERN = re.compile(r"```(?:\w+)?\n(.*?)\n```", re.DOTALL)
 
 
-def extract_code(code: str) -> list[str]:
-    if "```python" in code:
-        code_blocks = CODE_PATTERN.findall(code)
-        return "\n".join(code_blocks).strip()
-    else:
+def extract_code(code: str) -> str:
+    if "```python" not in code:
         return code.strip()
+    code_blocks = CODE_PATTERN.findall(code)
+    # Most answers hold a single block, which needs no join
+    if len(code_blocks) == 1:
+        return code_blocks[0].strip()
+    return "\n".join(code_blocks).strip()
+
+
+def run_async(main: Coroutine[Any, Any, Any]) -> Any:
+    r"""Run a coroutine to completion on uvloop when installed, otherwise on asyncio."""
+    if uvloop is not None:
+        return uvloop.run(main)
+    return asyncio.run(main)
+
+
+def _encode(obj: Any) -> bytes:
+    r"""Serialize obj to JSON bytes with orjson, falling back to json for big ints."""
+    try:
+        return orjson.dumps(obj)
+    except orjson.JSONEncodeError:
+        # orjson rejects integers beyond 64 bits, stdlib json keeps them exact
+        return json.dumps(obj).encode()
 
 
-async def judge(id: str, submission: dict) -> dict:
+async def judge(session: aiohttp.ClientSession, id: str, submission: dict) -> dict:
     start_time = time.time()
-    async with aiohttp.ClientSession() as session:
-        async with session.post(API_BASE_URL, json=submission) as response:
-            result = await response.json()
+    # orjson encodes straight to bytes, much faster than aiohttp's default json.dumps
+    body = _encode(submission)
+    async with session.post(API_BASE_URL, data=body, headers=JSON_HEADERS) as response:
+        result = orjson.loads(await response.read())
     end_time = time.time()
     # Add request latency to the result
     result["request_latency"] = end_time - start_time  # seconds
     return id, result
 
 
-async def process_all_submissions(submissions: dict):
+async def judge_batch(
+    session: aiohttp.ClientSession, items: list[tuple[Any, dict]]
+) -> list[tuple[Any, dict]]:
+    r"""Judge several (id, submission) pairs with one request to the batch endpoint."""
+    start_time = time.time()
+    body = _encode({"submissions": [submission for _, submission in items]})
+    async with session.post(BATCH_API_URL, data=body, headers=JSON_HEADERS) as response:
+        content = await response.read()
+    end_time = time.time()
+    try:
+        results = orjson.loads(content)["results"]
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        results = None
+    # A short or malformed reply fails only the submissions of this batch, not the whole run
+    if not isinstance(results, list) or len(results) != len(items):
+        error = f"Malformed batch response (HTTP {response.status}): {content[:200]!r}"
+        results = [{"status": "system_error", "error_message": error} for _ in items]
+    # Every result in the batch shares the latency of the request that carried it
+    for result in results:
+        result["request_latency"] = end_time - start_time  # seconds
+    return [(id, result) for (id, _), result in zip(items, results, strict=True)]
+
+
+async def process_all_submissions(
+    submissions: Iterable[tuple[Any, dict]],
+    total: int | None = None,
+    concurrency: int | None = None,
+    failed_path: str | None = None,
+    batch_size: int = 1,
+    deduplicate: bool = False,
+) -> tuple[list[tuple[Any, dict]], float]:
+    r"""Judge (id, submission) pairs, returning the results and the seconds spent judging."""
     progress = get_progress_bar()
-    tasks = []
-    semaphore = asyncio.Semaphore(os.cpu_count())
-
-    async def limited_judge(id, submission):
-        async with semaphore:
-            return await judge(id, submission)
-
-    with progress:
-        sub = progress.add_task("[cyan]Processing submissions...", total=len(submissions))
-        for id, submission in submissions.items():
-            task = asyncio.create_task(limited_judge(id, submission))
-            tasks.append(task)
-        results = []
-        for future in asyncio.as_completed(tasks):
-            result = await future
-            results.append(result)
-            progress.update(sub, advance=1)
-    return results
-
-
-def dump_failed_result(results: dict, submissions: dict, file_path: str):
-    with open(file_path, "w") as f:
-        for id, result in results:
-            if result.get("status") == "accepted":
-                continue
-            submission = submissions[id]
-            if isinstance(submission, Submission):
-                submission = submission.__dict__
-            f.write(f"Submission for {id}:\n")
-            f.write(f"{submission['code']}\n")
-            f.write(f"time_limit: {submission['time_limit']}\n")
-            f.write(f"memory_limit: {submission['memory_limit']}\n")
-            f.write(f"Result for {id}:\n")
-            f.write(json.dumps(result, indent=4))
-            f.write("\n")
-
-
-def print_stress_test_summary(results, total_time, total_samples, console):
-    r"""Generate and print a comprehensive stress test summary."""
-    # Status distribution
-    results = [result for _, result in results]
-    status_counts = Counter(result.get("status") for result in results)
+    # Judging is I/O-bound, so one event loop can keep many requests in flight
+    concurrency = concurrency or DEFAULT_CONCURRENCY
+    # One pooled session for the whole run so requests reuse keep-alive connections
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    # Bounded so a lazy producer only runs a little ahead of the judge
+    queue = asyncio.Queue(maxsize=2 * concurrency * batch_size)
+    # Sized sources are already in memory, lazy ones may read and preprocess on every next()
+    is_lazy = not hasattr(submissions, "__len__")
+    if total is None and not is_lazy:
+        total = len(submissions)
+    if failed_path is not None:
+        os.makedirs(os.path.dirname(failed_path) or ".", exist_ok=True)
+        failed_file = open(failed_path, "wb", buffering=1 << 20)
+    else:
+        failed_file = nullcontext()
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        with progress, failed_file:
+            sub = progress.add_task("[cyan]Processing submissions...", total=total)
+            results = []
+            # With deduplicate, identical bodies share the verdict of the first one judged
+            representatives = {}  # id -> body digest, for submissions that are sent
+            verdicts = {}  # body digest -> (id, summary) of the judged representative
+            duplicates = []
+            # The clock starts at the first request, so dataset ingest is not counted
+            start_time = None
+
+            async def produce():
+                # Submissions built by a generator are prepared while earlier ones are judged
+                seen = set()
+                source = iter(submissions)
+                while True:
+                    # Pull lazy items in a thread so in-flight responses are read on time
+                    if is_lazy:
+                        item = await asyncio.to_thread(next, source, _EXHAUSTED)
+                    else:
+                        item = next(source, _EXHAUSTED)
+                    if item is _EXHAUSTED:
+                        break
+                    id, submission = item
+                    if deduplicate:
+                        key = hashlib.blake2b(_encode(submission), digest_size=16).digest()
+                        if key in seen:
+                            duplicates.append((id, submission, key))
+                            continue
+                        seen.add(key)
+                        representatives[id] = key
+                    await queue.put((id, submission))
+                for _ in range(concurrency):
+                    await queue.put(None)
+
+            async def consume():
+                nonlocal start_time
+                finished = False
+                while not finished and (item := await queue.get()) is not None:
+                    # Top the batch up with whatever is already queued, without waiting for more
+                    batch = [item]
+                    while len(batch) < batch_size and not queue.empty():
+                        if (item := queue.get_nowait()) is None:
+                            finished = True
+                            break
+                        batch.append(item)
+
+                    if start_time is None:
+                        start_time = time.time()
+                    if len(batch) == 1:
+                        judged = [await judge(session, *batch[0])]
+                    else:
+                        judged = await judge_batch(session, batch)
+
+                    for (id, result), (_, submission) in zip(judged, batch, strict=True):
+                        if failed_path is not None and result.get("status") != "accepted":
+                            dump_failed_result(failed_file, id, submission, result)
+                        # Keep only what the summary needs, full outputs are not held to the end
+                        summary = {key: result.get(key) for key in SUMMARY_FIELDS}
+                        results.append((id, summary))
+                        if id in representatives:
+                            verdicts[representatives.pop(id)] = (id, summary)
+                    progress.update(sub, advance=len(batch))
+
+            await asyncio.gather(produce(), *(consume() for _ in range(concurrency)))
+            total_time = time.time() - start_time if start_time is not None else 0.0
+
+            for id, submission, key in duplicates:
+                first_id, summary = verdicts[key]
+                # Tagged so the summary can leave requests that were never sent out of its stats
+                duplicate = {**summary, "duplicate_of": first_id}
+                if failed_path is not None and summary.get("status") != "accepted":
+                    dump_failed_result(failed_file, id, submission, duplicate)
+                results.append((id, duplicate))
+            progress.update(sub, advance=len(duplicates))
+    return results, total_time
+
+
+def dump_failed_result(f: BinaryIO, id: Any, submission: dict, result: dict):
+    if isinstance(submission, Submission):
+        submission = submission.__dict__
+    # One write per record: header, then the result serialized straight to bytes
+    header = (
+        f"Submission for {id}:\n{submission['code']}\n"
+        f"time_limit: {submission['time_limit']}\n"
+        f"memory_limit: {submission['memory_limit']}\n"
+        f"Result for {id}:\n"
+    )
+    f.write(header.encode() + orjson.dumps(result, option=orjson.OPT_INDENT_2) + b"\n")
+
+
+def print_stress_test_summary(results, total_time, total_samples, console, as_json=False):
+    r"""Generate and print a comprehensive stress test summary, returning the stats."""
+    # Status distribution and performance metrics, gathered in a single pass
+    status_counts = Counter()
+    latencies = []
+    execution_times = []
+    memory_usages = []
+    deduplicated = 0
+    for _, result in results:
+        # Deduplicated results reuse another verdict, no request was sent for them
+        if result.get("duplicate_of") is not None:
+            deduplicated += 1
+            continue
+        # str() so a missing status still makes a valid JSON key
+        status_counts[str(result.get("status"))] += 1
+        latencies.append(result.get("request_latency", 0))
+        if (execution_time := result.get("execution_time")) is not None:
+            execution_times.append(execution_time)
+        if (memory_usage := result.get("memory_usage")) is not None:
+            memory_usages.append(memory_usage)
+    processed = len(latencies)
+    # Contiguous float64 arrays, so every statistic below is a vectorized reduction
+    latencies = np.asarray(latencies, dtype=np.float64)
+    execution_times = np.asarray(execution_times, dtype=np.float64)
+    memory_usages = np.asarray(memory_usages, dtype=np.float64)
     accepted_count = status_counts.get("accepted", 0)
-    success_rate = (accepted_count / len(results)) * 100 if results else 0
-
-    # Performance metrics
-    latencies = [result.get("request_latency", 0) for result in results]
-    execution_times = [
-        result.get("execution_time", 0)
-        for result in results
-        if result.get("execution_time") is not None
-    ]
-    memory_usages = [
-        result.get("memory_usage", 0)
-        for result in results
-        if result.get("memory_usage") is not None
-    ]
+    success_rate = (accepted_count / processed) * 100 if processed else 0
 
     # Calculate throughput
-    throughput = len(results) / total_time if total_time > 0 else 0
+    throughput = processed / total_time if total_time > 0 else 0
+
+    # One selection pass per metric for all percentiles instead of a full sort
+    metrics = {"request_latency": latencies}
+    if execution_times.size:
+        metrics["execution_time"] = execution_times
+    if memory_usages.size:
+        metrics["memory_usage"] = memory_usages
+    quantiles = {
+        name: np.quantile(values, PERCENTILES, method="higher").tolist()
+        for name, values in metrics.items()
+        if values.size
+    }
+    stats = {
+        "total_samples": total_samples,
+        "processed": processed,
+        "deduplicated": deduplicated,
+        "success_rate": success_rate,
+        "total_time": total_time,
+        "throughput": throughput,
+        "status_counts": dict(status_counts),
+        "percentiles": {
+            f"P{round(p * 100)}": {name: q[i] for name, q in quantiles.items()}
+            for i, p in enumerate(PERCENTILES)
+        },
+    }
+
+    # Machine-readable output skips building the rich tables altogether
+    if as_json:
+        console.out(orjson.dumps(stats).decode("utf-8"), highlight=False)
+        return stats
 
     # Create summary table
     summary_table = Table(title="Stress Test Summary", box=box.ROUNDED)
@@ -190,31 +365,33 @@ def print_stress_test_summary(results, total_time, total_samples, console):
     summary_table.add_column("Value", style="bright_white")
 
     summary_table.add_row("Total Samples", str(total_samples))
-    summary_table.add_row("Processed Samples", str(len(results)))
+    summary_table.add_row("Processed Samples", str(processed))
+    if deduplicated:
+        summary_table.add_row("Deduplicated Samples", str(deduplicated))
     summary_table.add_row("Success Rate", f"{success_rate:.2f}%")
     summary_table.add_row("Total Time", f"{total_time:.2f} seconds")
     summary_table.add_row("Throughput", f"{throughput:.2f} requests/second")
 
-    if latencies:
-        summary_table.add_row("Avg Request Latency", f"{mean(latencies):.2f} seconds")
-        summary_table.add_row("Median Request Latency", f"{median(latencies):.2f} seconds")
+    if latencies.size:
+        summary_table.add_row("Avg Request Latency", f"{latencies.mean():.2f} seconds")
+        summary_table.add_row("Median Request Latency", f"{np.median(latencies):.2f} seconds")
         summary_table.add_row(
-            "Min/Max Request Latency", f"{min(latencies):.2f}/{max(latencies):.2f} seconds"
+            "Min/Max Request Latency", f"{latencies.min():.2f}/{latencies.max():.2f} seconds"
         )
 
-    if execution_times:
-        summary_table.add_row("Avg Execution Time", f"{mean(execution_times):.2f} seconds")
-        summary_table.add_row("Median Execution Time", f"{median(execution_times):.2f} seconds")
+    if execution_times.size:
+        summary_table.add_row("Avg Execution Time", f"{execution_times.mean():.2f} seconds")
+        summary_table.add_row("Median Execution Time", f"{np.median(execution_times):.2f} seconds")
         summary_table.add_row(
             "Min/Max Execution Time",
-            f"{min(execution_times):.2f}/{max(execution_times):.2f} seconds",
+            f"{execution_times.min():.2f}/{execution_times.max():.2f} seconds",
         )
 
-    if memory_usages:
-        summary_table.add_row("Avg Memory Usage", f"{mean(memory_usages):.2f} MB")
-        summary_table.add_row("Median Memory Usage", f"{median(memory_usages):.2f} MB")
+    if memory_usages.size:
+        summary_table.add_row("Avg Memory Usage", f"{memory_usages.mean():.2f} MB")
+        summary_table.add_row("Median Memory Usage", f"{np.median(memory_usages):.2f} MB")
         summary_table.add_row(
-            "Min/Max Memory Usage", f"{min(memory_usages):.2f}/{max(memory_usages):.2f} MB"
+            "Min/Max Memory Usage", f"{memory_usages.min():.2f}/{memory_usages.max():.2f} MB"
         )
 
     # Create status distribution table
@@ -224,48 +401,30 @@ def print_stress_test_summary(results, total_time, total_samples, console):
     status_table.add_column("Percentage", style="bright_white")
 
     for status, count in sorted(status_counts.items()):
-        percentage = (count / len(results)) * 100 if results else 0
+        percentage = (count / processed) * 100 if processed else 0
         status_style = "bright_green" if status == "accepted" else "bright_red"
         status_table.add_row(
             f"[{status_style}]{status}[/{status_style}]", str(count), f"{percentage:.2f}%"
         )
 
     # Create performance percentiles table
-    if latencies:
+    if latencies.size:
         perf_table = Table(title="Performance Percentiles", box=box.ROUNDED)
         perf_table.add_column("Percentile", style="bright_cyan")
         perf_table.add_column("Request Latency (seconds)", style="bright_white")
-        if execution_times:
+        if execution_times.size:
             perf_table.add_column("Execution Time (seconds)", style="bright_white")
-        if memory_usages:
+        if memory_usages.size:
             perf_table.add_column("Memory Usage (MB)", style="bright_white")
 
-        sorted_latencies = sorted(latencies)
-        sorted_exec_times = sorted(execution_times) if execution_times else []
-        sorted_memory = sorted(memory_usages) if memory_usages else []
-
-        for p in [50, 75, 90, 95, 99]:
-            idx = int(len(sorted_latencies) * (p / 100))
-            lat_p = sorted_latencies[idx] if idx < len(sorted_latencies) else 0
-
-            row = [f"P{p}", f"{lat_p:.2f}"]
-
-            if execution_times:
-                idx = int(len(sorted_exec_times) * (p / 100))
-                exec_p = sorted_exec_times[idx] if idx < len(sorted_exec_times) else 0
-                row.append(f"{exec_p:.2f}")
-
-            if memory_usages:
-                idx = int(len(sorted_memory) * (p / 100))
-                mem_p = sorted_memory[idx] if idx < len(sorted_memory) else 0
-                row.append(f"{mem_p:.2f}")
-
-            perf_table.add_row(*row)
+        for i, p in enumerate(PERCENTILES):
+            perf_table.add_row(f"P{round(p * 100)}", *(f"{q[i]:.2f}" for q in quantiles.values()))
 
     # Print all tables
     console.print("\n")
     console.print(Panel.fit("🚀 MINI-JUDGE BENCHMARK RESULTS 🚀", style="bright_green"))
     console.print(summary_table)
     console.print(status_table)
-    if latencies:
+    if latencies.size:
         console.print(perf_table)
+    return stats
@@ -19,9 +19,11 @@ print(add(a, b))
         "time_limit": 1,
         "memory_limit": 256,
     }
-    for _ in range(10):
-        response = requests.post(f"{API_BASE_URL}", json=submission)
-        print(response.json())
+    # One session keeps a single keep-alive connection across all warmup requests
+    with requests.Session() as session:
+        for _ in range(10):
+            response = session.post(f"{API_BASE_URL}", json=submission)
+            print(response.json())
 
 
 if __name__ == "__main__":
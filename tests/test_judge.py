@@ -418,3 +418,35 @@ class Solution:
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == JudgeStatus.ACCEPTED
+
+
+@pytest.mark.asyncio
+async def test_batch_results_in_order(async_client, api_base_url):
+    r"""Test the batch endpoint returns one result per submission, in submission order."""
+    test_code = """
+a, b = map(int, input().split())
+print(a + b)
+"""
+    submissions = [
+        {
+            "code": test_code,
+            "language": Language.PYTHON.value,
+            "mode": JudgeMode.ACM.value,
+            "test_cases": [{"input": "1 2", "expected": expected}],
+            "time_limit": 1,
+            "memory_limit": 256,
+        }
+        for expected in ("3", "4", "3")
+    ]
+
+    response = await async_client.post(
+        f"{api_base_url}/api/v1/judge/batch", json={"submissions": submissions}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [result["status"] for result in data["results"]] == [
+        JudgeStatus.ACCEPTED,
+        JudgeStatus.WRONG_ANSWER,
+        JudgeStatus.ACCEPTED,
+    ]